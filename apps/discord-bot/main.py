@@ -1,21 +1,26 @@
-import os, asyncio, time, logging
-from typing import Dict, Tuple, Optional
+from __future__ import annotations
+
+import os, sys, asyncio, time, logging
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Tuple, Optional
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+from cachetools import TTLCache
 from dotenv import load_dotenv
 import discord
-from discord.ext import commands
 from discord.utils import utcnow
 
-from apps.rhid_runner.automator import run_rhid_punch
-
 # -----------------------------------------------------------------------------
 # Setup
 # -----------------------------------------------------------------------------
 load_dotenv()
 
 LOGLEVEL = os.environ.get("LOGLEVEL", "INFO").upper()
+logging.Formatter.default_msec_format = None  # asctime sem ",mmm": um format a menos por registro
 logging.basicConfig(level=LOGLEVEL, format="%(asctime)s %(levelname)s %(message)s")
 log = logging.getLogger("discord")
 
@@ -24,15 +29,25 @@ ALLOWED_GUILD_ID    = os.environ.get("ALLOWED_GUILD_ID")
 RATE_LIMIT_SECONDS  = int(os.environ.get("RATE_LIMIT_SECONDS", "60"))
 APP_TZ              = os.environ.get("APP_TZ", "America/Sao_Paulo")  # <<<<<< Timezone da aplicação
 TZ                  = ZoneInfo(APP_TZ)
-
-if not DISCORD_BOT_TOKEN:
-    raise RuntimeError("DISCORD_BOT_TOKEN ausente no .env")
-
-intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-recent: Dict[int, float] = {}        # anti-spam (por usuário)
-automation_lock = asyncio.Lock()     # serializar execuções do automator
+_UTC                = ZoneInfo("UTC")
+
+bot = None                           # commands.Bot, criado em _bootstrap()
+
+RECENT_MAX = 4096                    # teto de usuários rastreados pelo anti-spam
+# anti-spam: user_id -> instante (monotonic) do último punch; expira sozinho após RATE_LIMIT_SECONDS
+recent: TTLCache = TTLCache(maxsize=RECENT_MAX, ttl=RATE_LIMIT_SECONDS)
+PUNCH_QUEUE_MAX = 8                  # punches pendentes aceitos antes de recusar
+_punch_queue: asyncio.Queue = asyncio.Queue(maxsize=PUNCH_QUEUE_MAX)  # (trigger, user, future)
+_punch_worker_task: Optional[asyncio.Task] = None  # consumidor único, iniciado no on_ready
+_background_tasks: set = set()       # referências fortes p/ tasks fire-and-forget
+def _new_executor() -> ProcessPoolExecutor:
+    # processo dedicado ao automator: Chrome/Selenium fora do GIL do bot (1 worker basta, é serial).
+    # 'spawn' para não herdar por fork o event loop, threads do aiohttp e o socket do gateway.
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+# criado no primeiro punch: com 'spawn' o worker reimporta este módulo como __mp_main__,
+# e um pool criado no import faria cada worker montar (e nunca usar) o seu próprio
+executor: Optional[ProcessPoolExecutor] = None
 
 # -----------------------------------------------------------------------------
 # Funções auxiliares de data/hora
@@ -42,33 +57,98 @@ def _fmt_dt_local(dt_aware_utc: datetime) -> str:
     Recebe datetime aware em UTC e devolve string no fuso da app (TZ).
     Formato: 03/10/2025 11:22:33 BRT
     """
-    return dt_aware_utc.astimezone(TZ).strftime("%d/%m/%Y %H:%M:%S %Z")
+    if dt_aware_utc.tzinfo is TZ:  # já está no fuso da app
+        dt_local = dt_aware_utc
+    else:
+        dt_local = dt_aware_utc.astimezone(TZ)
+    return dt_local.strftime("%d/%m/%Y %H:%M:%S %Z")
+
+if sys.version_info >= (3, 11):
+    _iso_parse = datetime.fromisoformat  # 3.11+ já entende o 'Z' final
+else:
+    def _iso_parse(ts: str) -> datetime:
+        if ts.endswith("Z"):
+            ts = ts[:-1] + "+00:00"
+        return datetime.fromisoformat(ts)
 
 def _parse_ts_iso_to_utc(ts: str) -> Optional[datetime]:
     """
     Tenta parsear um ISO8601, aceitando 'Z'. Retorna aware em UTC.
     """
+    if not isinstance(ts, str):
+        return None
+    # caminho rápido: 'aaaa-mm-ddTHH:MM:SSZ' de tamanho fixo (o que o automator emite);
+    # separadores e dígitos conferidos, senão int() aceitaria '+1', ' 1' etc.
+    if (len(ts) == 20 and ts[-1] == "Z" and ts[4] == ts[7] == "-" and ts[10] == "T"
+            and ts[13] == ts[16] == ":"
+            and (ts[0:4] + ts[5:7] + ts[8:10] + ts[11:13] + ts[14:16] + ts[17:19]).isdigit()):
+        try:
+            return datetime(
+                int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+                int(ts[11:13]), int(ts[14:16]), int(ts[17:19]),
+                tzinfo=_UTC,
+            )
+        except ValueError:
+            return None
     try:
-        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-        return dt.astimezone(ZoneInfo("UTC"))
-    except Exception:
+        dt = _iso_parse(ts)
+    except (TypeError, ValueError):
         return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=_UTC)
+    if dt.utcoffset():
+        return dt.astimezone(_UTC)
+    return dt
 
 def _try_parse_card_hora_to_utc(hora_str: str) -> Optional[datetime]:
     """
     Para payloads 'card' onde hora veio como '03/10/2025 14:14:54 UTC'.
     Converte para aware UTC se possível.
     """
+    # formato fixo 'dd/mm/aaaa HH:MM:SS[ UTC]': fatiamos direto, sem strptime
+    s = hora_str
+    if len(s) < 19 or s[19:] not in ("", " UTC"):
+        return None
+    if s[2] != "/" or s[5] != "/" or s[10] != " " or s[13] != ":" or s[16] != ":":
+        return None
     try:
-        # dia/mês/ano HH:MM:SS UTC
-        dt_naive = datetime.strptime(hora_str.replace(" UTC", ""), "%d/%m/%Y %H:%M:%S")
-        return dt_naive.replace(tzinfo=ZoneInfo("UTC"))
-    except Exception:
+        return datetime(
+            int(s[6:10]), int(s[3:5]), int(s[0:2]),
+            int(s[11:13]), int(s[14:16]), int(s[17:19]),
+            tzinfo=_UTC,
+        )
+    except ValueError:
         return None
 
 # -----------------------------------------------------------------------------
 # Builders de embed bonitões
 # -----------------------------------------------------------------------------
+_EMBED_TITLE = "✅ RHID"
+_EMBED_DESCRIPTION = "Rotina de marcação de ponto"
+_DEFAULT_COLOR = 0x2E86D9
+_CARD_COLOR = 0x4A90E2
+
+# Apelidos/ícones para os campos vindos do automator
+_ALIASES = {
+    "Horário": "🕒 Horário",
+    "Modo": "⚙️ Modo",
+    "E-mail": "📧 E-mail",
+    "Localização": "📍 Localização",
+    "Etapas": "🧭 Etapas",
+    "Resultado": "✅ Resultado",
+    "Duração": "⏱️ Duração",
+}
+
+@functools.lru_cache(maxsize=64)
+def _maps_view(url: str) -> discord.ui.View:
+    """
+    View com só o botão-link "Abrir no Maps". Botões de link não têm callback
+    nem estado, então a mesma View pode ser reaproveitada entre mensagens.
+    """
+    view = discord.ui.View(timeout=None)
+    view.add_item(discord.ui.Button(style=discord.ButtonStyle.link, label="Abrir no Maps", url=url))
+    return view
+
 def _embed_from_embeds_dict(payload: dict) -> Tuple[Optional[str], discord.Embed, Optional[discord.ui.View]]:
     """
     Converte payload {'content','embeds':[...],'maps_url':...} em (content, embed, view)
@@ -76,11 +156,11 @@ def _embed_from_embeds_dict(payload: dict) -> Tuple[Optional[str], discord.Embed
     um campo '🕒 Horário' formatado em TZ.
     """
     ed = (payload.get("embeds") or [{}])[0]
-    color_int = ed.get("color") or 0x2E86D9
+    color_int = ed.get("color") or _DEFAULT_COLOR
 
     embed = discord.Embed(
-        title="✅ RHID",
-        description="Rotina de marcação de ponto",
+        title=_EMBED_TITLE,
+        description=_EMBED_DESCRIPTION,
         color=color_int,
         timestamp=utcnow(),  # timestamp do Discord (o cliente converte para o fuso do usuário)
     )
@@ -94,17 +174,8 @@ def _embed_from_embeds_dict(payload: dict) -> Tuple[Optional[str], discord.Embed
 
     # Reaproveita os campos existentes, mas com apelidos/ícones quando possível
     fields = ed.get("fields") or []
-    aliases = {
-        "Horário": "🕒 Horário",
-        "Modo": "⚙️ Modo",
-        "E-mail": "📧 E-mail",
-        "Localização": "📍 Localização",
-        "Etapas": "🧭 Etapas",
-        "Resultado": "✅ Resultado",
-        "Duração": "⏱️ Duração",
-    }
     for f in fields:
-        name = aliases.get(f.get("name", ""), f.get("name", "-"))
+        name = _ALIASES.get(f.get("name", ""), f.get("name", "-"))
         embed.add_field(
             name=name,
             value=f.get("value", "—"),
@@ -117,13 +188,8 @@ def _embed_from_embeds_dict(payload: dict) -> Tuple[Optional[str], discord.Embed
         embed.set_footer(text=txt)
 
     # Botão "Abrir no Maps"
-    view = None
     maps_url = payload.get("maps_url")
-    if maps_url:
-        view = discord.ui.View()
-        view.add_item(
-            discord.ui.Button(style=discord.ButtonStyle.link, label="Abrir no Maps", url=maps_url)
-        )
+    view = _maps_view(maps_url) if maps_url else None
 
     return payload.get("content") or None, embed, view
 
@@ -133,12 +199,12 @@ def _embed_from_card_dict(card: dict) -> Tuple[Optional[str], discord.Embed, Opt
     Converte dict 'card' (retornado pelo automator) em Embed estilizado.
     Campos esperados: hora (string) e/ou hora_iso (ISO), modo, email, lat, lon, etapas, resultado, duracao, trigger, maps_url.
     """
-    color = 0x4A90E2
+    now = utcnow()  # um único "agora" para o timestamp e o fallback do horário
     embed = discord.Embed(
-        title="✅ RHID",
-        description="Rotina de marcação de ponto",
-        color=color,
-        timestamp=utcnow(),
+        title=_EMBED_TITLE,
+        description=_EMBED_DESCRIPTION,
+        color=_CARD_COLOR,
+        timestamp=now,
     )
 
     # --- Horário em Brasília (ou TZ escolhida)
@@ -151,7 +217,7 @@ def _embed_from_card_dict(card: dict) -> Tuple[Optional[str], discord.Embed, Opt
     if not dt_utc and isinstance(card.get("hora"), str):
         dt_utc = _try_parse_card_hora_to_utc(card["hora"])
     if not dt_utc:
-        dt_utc = utcnow()
+        dt_utc = now
 
     embed.add_field(name="🕒 Horário", value=_fmt_dt_local(dt_utc), inline=True)
 
@@ -182,48 +248,154 @@ def _embed_from_card_dict(card: dict) -> Tuple[Optional[str], discord.Embed, Opt
     embed.set_footer(text=f"Trigger: {trig}")
 
     # Botão de Maps (se houver)
-    view = None
-    if maps_url:
-        view = discord.ui.View()
-        view.add_item(discord.ui.Button(style=discord.ButtonStyle.link, label="Abrir no Maps", url=maps_url))
+    view = _maps_view(maps_url) if maps_url else None
 
     return None, embed, view
 
 
+# chaves que identificam um dict 'card' não marcado
+_CARD_KEYS = frozenset({
+    "hora", "hora_iso", "timestamp", "modo", "email", "lat", "lon",
+    "etapas", "resultado", "duracao", "trigger", "maps_url",
+})
+
+# kind -> builder, para os resultados já marcados pelo automator
+_BUILDERS = {
+    "embeds": _embed_from_embeds_dict,
+    "card": _embed_from_card_dict,
+}
+
 def build_embed_from_result(result) -> Tuple[Optional[str], discord.Embed, Optional[discord.ui.View]]:
     """
     Aceita:
+      - tupla (kind, payload) do automator, kind em "embeds" | "card" | "str"
       - dict com chave "embeds" (estilo discord-webhook)  -> _embed_from_embeds_dict
       - dict "card" simplificado                          -> _embed_from_card_dict
       - string (fallback)                                 -> descrição simples
     """
-    if isinstance(result, dict):
+    if isinstance(result, tuple):
+        kind, result = result
+        builder = _BUILDERS.get(kind)
+        if builder is not None:
+            return builder(result)
+    elif isinstance(result, dict):
         if "embeds" in result:
             return _embed_from_embeds_dict(result)
-        card_keys = {"hora", "hora_iso", "timestamp", "modo", "email", "lat", "lon", "etapas", "resultado", "duracao", "trigger", "maps_url"}
-        if any(k in result for k in card_keys):
+        if result.keys() & _CARD_KEYS:
             return _embed_from_card_dict(result)
 
     # fallback: string
     embed = discord.Embed(
-        title="✅ RHID",
+        title=_EMBED_TITLE,
         description=str(result),
-        color=0x2E86D9,
+        color=_DEFAULT_COLOR,
         timestamp=utcnow(),
     )
     return None, embed, None
 
 # -----------------------------------------------------------------------------
-# Execução do automator (thread pool)
+# Execução do automator (process pool)
 # -----------------------------------------------------------------------------
 async def run_rhid_punch_async(trigger: str, who: discord.abc.User):
+    # import tardio: selenium/webdriver_manager só carregam no primeiro punch
+    from apps.rhid_runner.automator import run_rhid_punch
+
     loop = asyncio.get_running_loop()
-    def _run_blocking():
-        return run_rhid_punch(trigger=trigger, discord_user={
-            "id": str(who.id),
-            "username": f"{who.name}#{who.discriminator}",
-        })
-    return await loop.run_in_executor(None, _run_blocking)
+    # só tipos simples atravessam para o worker (precisam ser picklable)
+    _run_blocking = functools.partial(run_rhid_punch, trigger=trigger, discord_user={
+        "id": str(who.id),
+        "username": str(who),  # discord.py já omite o "#0" de contas sem discriminator
+    })
+    global executor
+    if executor is None:
+        executor = _new_executor()
+    try:
+        return await loop.run_in_executor(executor, _run_blocking)
+    except BrokenProcessPool:
+        # worker morreu (OOM, segfault): sem recriar, todo punch seguinte falharia.
+        # Não reenvia: o worker pode ter morrido depois do clique final e o ponto já
+        # estar batido; quem decide tentar de novo é o usuário.
+        log.warning("Worker do automator morreu; recriando o pool.")
+        executor.shutdown(wait=False)
+        executor = _new_executor()
+        raise
+
+def _shutdown_automator() -> None:
+    """
+    Fecha o Chrome mantido pelo worker e encerra o pool. Precisa ser explícito:
+    o atexit do automator não roda dentro de um worker de ProcessPoolExecutor.
+    """
+    if executor is None:
+        return
+    from apps.rhid_runner.automator import close_session
+    try:
+        executor.submit(close_session).result(timeout=30)
+    except Exception:
+        log.exception("Falha ao encerrar a sessão do Chrome no worker")
+    executor.shutdown(wait=True, cancel_futures=True)
+
+def _fire_and_forget(coro) -> None:
+    """Agenda a coroutine sem aguardar; loga falhas em vez de perdê-las."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+
+    def _done(t: asyncio.Task) -> None:
+        _background_tasks.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            log.error("Falha em tarefa de fundo", exc_info=t.exception())
+
+    task.add_done_callback(_done)
+
+async def _punch_worker() -> None:
+    """
+    Consumidor único da fila: roda um automator por vez e entrega o resultado
+    (ou a exceção) no future de quem pediu. Embed e followup ficam com o produtor.
+    """
+    while True:
+        trigger, who, fut = await _punch_queue.get()
+        try:
+            if fut.cancelled():
+                continue
+            result = await run_rhid_punch_async(trigger=trigger, who=who)
+            if not fut.done():
+                fut.set_result(result)
+        except Exception as e:
+            if not fut.done():
+                fut.set_exception(e)
+        finally:
+            _punch_queue.task_done()
+
+async def _do_punch(interaction: discord.Interaction, trigger: str) -> bool:
+    """
+    Fluxo comum do botão e do /baterponto: defer -> fila -> automator -> embed -> followup.
+    Com a fila cheia, recusa na hora em vez de empilhar mais espera. Diz se o punch foi aceito.
+    """
+    # defer antes de enfileirar: se ele falhar, o punch ainda não existe (com o worker
+    # ocioso o job começaria durante o HTTP do defer, sem ninguém p/ receber o resultado)
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    fut = asyncio.get_running_loop().create_future()
+    try:
+        _punch_queue.put_nowait((trigger, interaction.user, fut))
+    except asyncio.QueueFull:
+        log.warning("Fila de punch cheia; recusando (%s) de %s", trigger, interaction.user.id)
+        await interaction.followup.send("⏳ Sistema ocupado, tente mais tarde.", ephemeral=True)
+        return False
+    log.info("Punch (%s) de %s na fila: posição %s", trigger, interaction.user.id, _punch_queue.qsize())
+
+    try:
+        result = await fut
+
+        content, embed, view = build_embed_from_result(result)
+        kwargs = {"content": content, "embed": embed, "ephemeral": True}
+        if view is not None:
+            kwargs["view"] = view
+        await interaction.followup.send(**kwargs)
+
+    except Exception as e:
+        log.exception("Falha no punch (%s)", trigger)
+        await interaction.followup.send(f"❌ Erro: {e}", ephemeral=True)
+    return True
 
 # -----------------------------------------------------------------------------
 # UI: Botão "Bater Ponto"
@@ -235,37 +407,32 @@ class PunchView(discord.ui.View):
     @discord.ui.button(label="Bater Ponto", style=discord.ButtonStyle.success, custom_id="punch_button")
     async def punch(self, interaction: discord.Interaction, button: discord.ui.Button):
         user_id = interaction.user.id
-        now = time.time()
-        last = recent.get(user_id, 0)
-        if now - last < RATE_LIMIT_SECONDS:
-            await interaction.response.send_message(
+        now = time.monotonic()
+        last = recent.get(user_id)
+        if last is not None:
+            _fire_and_forget(interaction.response.send_message(
                 f"Aguarde {int(RATE_LIMIT_SECONDS - (now - last))}s para tentar novamente.",
                 ephemeral=True
-            )
+            ))
             return
-        recent[user_id] = now
+        recent[user_id] = now  # antes do await: segura cliques duplos durante o defer
 
-        await interaction.response.defer(ephemeral=True, thinking=True)
+        accepted = False
         try:
-            async with automation_lock:
-                result = await run_rhid_punch_async(trigger="button", who=interaction.user)
-
-            content, embed, view = build_embed_from_result(result)
-            kwargs = {"content": content, "embed": embed, "ephemeral": True}
-            if view is not None:
-                kwargs["view"] = view
-            await interaction.followup.send(**kwargs)
-
-        except Exception as e:
-            log.exception("Falha no punch (botão)")
-            await interaction.followup.send(f"❌ Erro: {e}", ephemeral=True)
+            accepted = await _do_punch(interaction, trigger="button")
+        finally:
+            if not accepted:  # fila cheia ou defer falhou: não conta p/ o anti-spam
+                recent.pop(user_id, None)
 
 # -----------------------------------------------------------------------------
 # Eventos & Slash Commands
 # -----------------------------------------------------------------------------
-@bot.event
 async def on_ready():
+    global _punch_worker_task
     log.info("Bot pronto como %s (id=%s)", bot.user, bot.user.id)
+    # on_ready dispara de novo a cada reconexão: o consumidor só sobe uma vez
+    if _punch_worker_task is None:
+        _punch_worker_task = asyncio.create_task(_punch_worker())
     try:
         if ALLOWED_GUILD_ID:
             guild = discord.Object(id=int(ALLOWED_GUILD_ID))
@@ -278,7 +445,6 @@ async def on_ready():
     except Exception:
         log.exception("Falha ao sincronizar slash commands")
 
-@bot.tree.command(name="postarponto", description="Publica o botão para bater ponto")
 async def postarponto(interaction: discord.Interaction):
     if interaction.guild is None:
         await interaction.response.send_message("Use em um servidor (não em DM).", ephemeral=True)
@@ -291,25 +457,32 @@ async def postarponto(interaction: discord.Interaction):
     )
     await interaction.response.send_message(embed=embed, view=view)
 
-@bot.tree.command(name="baterponto", description="Executa imediatamente a marcação de ponto")
 async def baterponto(interaction: discord.Interaction):
-    await interaction.response.defer(ephemeral=True, thinking=True)
-    try:
-        async with automation_lock:
-            result = await run_rhid_punch_async(trigger="slash", who=interaction.user)
-
-        content, embed, view = build_embed_from_result(result)
-        kwargs = {"content": content, "embed": embed, "ephemeral": True}
-        if view is not None:
-            kwargs["view"] = view
-        await interaction.followup.send(**kwargs)
-
-    except Exception as e:
-        log.exception("Erro no /baterponto")
-        await interaction.followup.send(f"❌ Erro: {e}", ephemeral=True)
+    await _do_punch(interaction, trigger="slash")
 
 # -----------------------------------------------------------------------------
 # Run
 # -----------------------------------------------------------------------------
+def _bootstrap() -> None:
+    """
+    Cria o bot e registra eventos/comandos. Fica fora do import do módulo para
+    que 'import main' não arraste discord.ext nem exija o token.
+    """
+    global bot
+    from discord.ext import commands
+
+    if not DISCORD_BOT_TOKEN:
+        raise RuntimeError("DISCORD_BOT_TOKEN ausente no .env")
+
+    intents = discord.Intents.default()
+    bot = commands.Bot(command_prefix="!", intents=intents)
+    bot.event(on_ready)
+    bot.tree.command(name="postarponto", description="Publica o botão para bater ponto")(postarponto)
+    bot.tree.command(name="baterponto", description="Executa imediatamente a marcação de ponto")(baterponto)
+    try:
+        bot.run(DISCORD_BOT_TOKEN)
+    finally:
+        _shutdown_automator()
+
 if __name__ == "__main__":
-    bot.run(DISCORD_BOT_TOKEN)
+    _bootstrap()
@@ -1,7 +1,7 @@
 import os
 
+_TRUTHY = frozenset({"1", "true", "yes", "y", "on", "t"})
+
 def env_bool(name: str, default: bool = False) -> bool:
     v = os.environ.get(name)
-    if v is None:
-        return default
-    return str(v).lower() in {"1", "true", "yes", "y"}
\ No newline at end of file
+    return default if v is None else v.lower() in _TRUTHY
@@ -3,11 +3,15 @@ from __future__ import annotations
 
 import os
 import time
+import atexit
 import logging
+import threading
 import tempfile
 import shutil
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Optional, Iterable, Tuple
+from urllib.parse import urlsplit
 
 from dotenv import load_dotenv
 from selenium import webdriver
@@ -17,7 +21,6 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import (
     TimeoutException,
     WebDriverException,
@@ -25,6 +28,7 @@ from selenium.common.exceptions import (
     StaleElementReferenceException,
     ElementClickInterceptedException,
     ElementNotInteractableException,
+    NoSuchDriverException,
 )
 
 # -----------------------------------------------------------------------------
@@ -44,10 +48,23 @@ POST_LOGIN_SELECTOR = os.environ.get("POST_LOGIN_SELECTOR", "")
 CHROME_BINARY = os.environ.get("CHROME_BINARY", "/usr/bin/google-chrome")
 PUNCH_DRY_RUN = os.environ.get("PUNCH_DRY_RUN", "false").lower() == "true"
 SCREENSHOT_ON_ERROR = os.environ.get("SCREENSHOT_ON_ERROR", "0") == "1"
+TYPE_MODE = os.environ.get("RHID_TYPE_MODE", "js")  # "js" = valor direto; qualquer outro = send_keys
+POLL = float(os.environ.get("RHID_POLL", "0.08"))  # intervalo dos WebDriverWait (padrão do Selenium: 0.5s)
 
 CHROME_USER_DATA_BASE = os.environ.get("CHROME_USER_DATA_BASE", "/tmp/rhid-chrome")
 os.makedirs(CHROME_USER_DATA_BASE, exist_ok=True)
 RHID_USE_USER_DATA = os.environ.get("RHID_USE_USER_DATA", "0") == "1"
+RHID_PERSIST_CACHE = os.environ.get("RHID_PERSIST_CACHE", "0") == "1"  # data/cache fixos entre sessões (desliga --incognito)
+# 'eager' = driver.get() volta no DOMContentLoaded; wait_dom_ready cuida do resto
+PAGE_LOAD_STRATEGY = os.environ.get("PAGE_LOAD_STRATEGY", "eager")
+RHID_BLOCK_ASSETS = os.environ.get("RHID_BLOCK_ASSETS", "1") == "1"  # 0 = carregar imagens/fontes/analytics
+
+# O fluxo só precisa do DOM: imagens, fontes e beacons são bloqueados via CDP
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg",
+    "*.woff", "*.woff2", "*.ttf",
+    "*google-analytics*", "*googletagmanager*", "*doubleclick*",
+]
 
 # Localização fixa (empresa) para compor a mensagem do Discord
 COMPANY_LAT = os.environ.get("COMPANY_LAT")
@@ -56,26 +73,38 @@ COMPANY_LON = os.environ.get("COMPANY_LON")
 # -----------------------------------------------------------------------------
 # Seletores flexíveis
 # -----------------------------------------------------------------------------
-EMAIL_SELECTORS = [
-    (By.ID, "email"),
-    (By.CSS_SELECTOR, "input#email.form-control.m-input"),
-]
-PASSWORD_SELECTORS = [
-    (By.ID, "password"),
-    (By.CSS_SELECTOR, "input#password.form-control.m-input"),
-]
 LOGIN_BTN_SELECTORS = [
     (By.XPATH, "//button[normalize-space()='Entrar']"),
     (By.CSS_SELECTOR, "button[type='submit']"),
     (By.CSS_SELECTOR, "button.btn.m-btn.m-btn--custom"),
 ]
 
+# Mesmos grupos em CSS puro: viram um seletor composto, uma espera só p/ o grupo todo
+EMAIL_CSS = ["input#email", "input#email.form-control.m-input"]
+
 # Overlays/Spinners comuns que podem interceptar clique
 OVERLAY_SELECTORS = [
     ".swal2-container", ".swal2-shown",
     ".modal.in", ".modal-backdrop",
     ".blockUI", ".block-overlay", ".loading", ".spinner", ".overlay",
 ]
+OVERLAY_CSS = ",".join(OVERLAY_SELECTORS)
+
+# Resolve true quando nenhum overlay visível casa com o seletor, false no timeout.
+# getClientRects() em vez de offsetParent: overlays position:fixed têm offsetParent null.
+JS_WAIT_NO_OVERLAYS = """
+const sel = arguments[0], deadline = Date.now() + arguments[1], cb = arguments[arguments.length - 1];
+(function tick() {
+  let present = false;
+  for (const n of document.querySelectorAll(sel)) {
+    const s = getComputedStyle(n);
+    if (n.getClientRects().length && s.visibility !== 'hidden' && s.display !== 'none') { present = true; break; }
+  }
+  if (!present) return cb(true);
+  if (Date.now() > deadline) return cb(false);
+  setTimeout(tick, 50);
+})();
+"""
 
 # -----------------------------------------------------------------------------
 # Helpers
@@ -107,164 +136,146 @@ def _screenshot(driver: webdriver.Chrome, path="/tmp/rhid-last.png"):
     except Exception:
         pass
 
+# Seta .value e dispara input/change (o que o Angular escuta); devolve se o valor ficou
+JS_SET_VALUE = (
+    "arguments[0].value = arguments[1];"
+    "arguments[0].dispatchEvent(new Event('input', {bubbles:true}));"
+    "arguments[0].dispatchEvent(new Event('change', {bubbles:true}));"
+    "return arguments[0].value === arguments[1];"
+)
+
+def _wait(drv: webdriver.Chrome, t: float, **kw) -> WebDriverWait:
+    """Único ponto que cria WebDriverWait: o intervalo de polling (POLL) fica só aqui."""
+    return WebDriverWait(drv, t, poll_frequency=POLL, **kw)
+
+def wait_until(driver: webdriver.Chrome, predicate, timeout: float) -> bool:
+    """Polla `predicate(driver)` até ser verdadeiro; False no timeout (não levanta)."""
+    try:
+        _wait(driver, timeout).until(predicate)
+        return True
+    except TimeoutException:
+        return False
+
+def _wait_rect_stable(driver: webdriver.Chrome, el, timeout: float = 1.0) -> bool:
+    """Espera o elemento parar de se mover (ex.: após scrollIntoView suave)."""
+    last = [None]
+    def _stable(d):
+        r = d.execute_script(
+            "const r = arguments[0].getBoundingClientRect(); return [r.left, r.top, r.width, r.height];", el
+        )
+        same = r == last[0]
+        last[0] = r
+        return same
+    return wait_until(driver, _stable, timeout)
+
 def wait_dom_ready(driver: webdriver.Chrome, timeout: int = TIMEOUT_SECONDS):
-    WebDriverWait(driver, timeout).until(
+    _wait(driver, timeout).until(
         lambda d: d.execute_script("return document.readyState") in ("interactive", "complete")
     )
 
 def wait_visible(driver: webdriver.Chrome, locator: Tuple[str, str], timeout: int = TIMEOUT_SECONDS):
-    return WebDriverWait(driver, timeout).until(EC.visibility_of_element_located(locator))
+    return _wait(driver, timeout).until(EC.visibility_of_element_located(locator))
 
-def find_first_visible(driver: webdriver.Chrome, locators: Iterable[Tuple[str, str]], timeout_each: int = 6):
-    last_exc = None
-    for by, sel in locators:
-        try:
-            el = wait_visible(driver, (by, sel), timeout=timeout_each)
-            log.info("Elemento encontrado por %s: %s", by, sel)
-            return el
-        except Exception as e:
-            last_exc = e
-    if last_exc:
-        raise last_exc
-    raise TimeoutException("Nenhum seletor visível encontrado.")
+def find_first_visible_css(driver: webdriver.Chrome, css_list: Iterable[str], timeout: int = 6):
+    """Espera qualquer seletor CSS do grupo ficar visível (um seletor composto, uma espera só)."""
+    sel = ",".join(css_list)
+    els = _wait(driver, timeout).until(EC.visibility_of_any_elements_located((By.CSS_SELECTOR, sel)))
+    log.info("Elemento encontrado por css: %s", sel)
+    return els[0]
 
 def maybe_already_logged(driver: webdriver.Chrome) -> bool:
     if not POST_LOGIN_SELECTOR:
         return False
     try:
-        WebDriverWait(driver, 3).until(EC.presence_of_element_located((By.CSS_SELECTOR, POST_LOGIN_SELECTOR)))
+        _wait(driver, 3).until(EC.presence_of_element_located((By.CSS_SELECTOR, POST_LOGIN_SELECTOR)))
         log.info("Detecção de sessão já logada pelo seletor: %s", POST_LOGIN_SELECTOR)
         return True
     except Exception:
         return False
 
+def _type_js(driver, locator, text, timeout_each=10) -> bool:
+    """Seta o valor via JS (1 round-trip) e diz se o campo aceitou."""
+    el = _wait(driver, timeout_each).until(EC.presence_of_element_located(locator))
+    try:
+        return bool(driver.execute_script(JS_SET_VALUE, el, text))
+    except StaleElementReferenceException:
+        return False
+
 def type_with_retry(driver, locator, text, attempts=3, timeout_each=10):
+    if TYPE_MODE == "js":
+        if _type_js(driver, locator, text, timeout_each):
+            return
+        log.info("Campo %s recusou valor via JS; digitando com send_keys.", locator)
     last_exc = None
     for _ in range(attempts):
         try:
-            el = WebDriverWait(driver, timeout_each).until(EC.element_to_be_clickable(locator))
+            el = _wait(driver, timeout_each).until(EC.element_to_be_clickable(locator))
             try:
-                el.click(); time.sleep(0.05); el.clear()
+                el.click(); el.clear()
             except StaleElementReferenceException:
-                el = WebDriverWait(driver, timeout_each).until(EC.element_to_be_clickable(locator))
-                el.click(); time.sleep(0.05); el.clear()
+                el = _wait(driver, timeout_each).until(EC.element_to_be_clickable(locator))
+                el.click(); el.clear()
+            _wait(driver, 2).until(lambda d: el.get_attribute("value") == "")
             el.send_keys(text)
+            _wait(driver, 2).until(EC.text_to_be_present_in_element_value(locator, text))
             return
         except StaleElementReferenceException as e:
             last_exc = e; time.sleep(0.2); continue
         except Exception as e:
             last_exc = e; break
     try:
-        el = WebDriverWait(driver, timeout_each).until(EC.presence_of_element_located(locator))
-        driver.execute_script(
-            "arguments[0].value = arguments[1];"
-            "arguments[0].dispatchEvent(new Event('input', {bubbles:true}));"
-            "arguments[0].dispatchEvent(new Event('change', {bubbles:true}));",
-            el, text
-        )
+        el = _wait(driver, timeout_each).until(EC.presence_of_element_located(locator))
+        driver.execute_script(JS_SET_VALUE, el, text)
         return
     except Exception as e:
         raise last_exc or e
 
-def _wait_no_overlays(driver: webdriver.Chrome, timeout: int = 8) -> None:
-    """Espera sumirem overlays que possam interceptar cliques."""
-    end = time.time() + timeout
-    while time.time() < end:
-        try:
-            present = False
-            for sel in OVERLAY_SELECTORS:
-                nodes = driver.find_elements(By.CSS_SELECTOR, sel)
-                for n in nodes:
-                    if n.is_displayed() and n.value_of_css_property("visibility") != "hidden":
-                        present = True
-                        break
-                if present:
-                    break
-            if not present:
-                return
-        except Exception:
-            pass
-        time.sleep(0.15)
+# scroll + hit-test + clique num só script: devolve {ok} ou {ok:false, reason}
+JS_CLICK = """
+const el = arguments[0];
+el.scrollIntoView({block: 'center'});
+if (el.disabled) return {ok: false, reason: 'disabled'};
+const r = el.getBoundingClientRect();
+if (r.width <= 0 || r.height <= 0) return {ok: false, reason: 'no-rect'};
+const x = r.left + r.width / 2, y = r.top + r.height / 2;
+const hit = document.elementFromPoint(x, y);
+if (hit !== el && !el.contains(hit)) return {ok: false, reason: 'obscured'};
+el.focus({preventScroll: true});
+el.dispatchEvent(new MouseEvent('click', {bubbles: true, cancelable: true, clientX: x, clientY: y, view: window}));
+return {ok: true};
+"""
 
-def _point_hits_element(driver: webdriver.Chrome, el) -> bool:
-    """Confere se o ponto central do elemento atinge o próprio elemento (não está coberto)."""
-    try:
-        rect = driver.execute_script("""
-            const r = arguments[0].getBoundingClientRect();
-            return {x: Math.floor(r.left + r.width/2), y: Math.floor(r.top + r.height/2), w:r.width, h:r.height};
-        """, el)
-        if rect["w"] <= 0 or rect["h"] <= 0:
-            return False
-        hit = driver.execute_script("""
-            const x = arguments[0], y = arguments[1], el = arguments[2];
-            const e = document.elementFromPoint(x, y);
-            return e === el || (e && el.contains(e));
-        """, rect["x"], rect["y"], el)
-        return bool(hit)
-    except Exception:
-        return False
+def _wait_no_overlays(driver: webdriver.Chrome, timeout: int = 8) -> None:
+    """
+    Espera sumirem overlays que possam interceptar cliques.
+    O polling roda inteiro no browser: um único round-trip, qualquer que seja a espera.
+    """
+    driver.execute_async_script(JS_WAIT_NO_OVERLAYS, OVERLAY_CSS, int(timeout * 1000))
 
 def robust_click(driver: webdriver.Chrome, el, *, timeout: int = 10) -> None:
     """
-    Clique robusto:
-    - scroll até o centro,
-    - espera sumirem overlays,
-    - testa se ponto central atinge o elemento,
-    - tenta .click(), depois Actions, por fim JS click com MouseEvent.
+    Clique robusto: JS_CLICK faz scroll, hit-test e o clique (MouseEvent) num só
+    round-trip. Se algo cobre o botão, espera os overlays sumirem e tenta de novo.
     """
     end = time.time() + timeout
     last_exc = None
 
     while time.time() < end:
         try:
-            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
-            _wait_no_overlays(driver, timeout=2)
-            time.sleep(0.05)
-
-            if (not el.is_displayed()) or (not el.is_enabled()):
-                time.sleep(0.2)
-                continue
-
-            if not _point_hits_element(driver, el):
-                # nudge leve para forçar repaint
-                ActionChains(driver).move_to_element_with_offset(el, 1, 1).perform()
-                time.sleep(0.1)
-                if not _point_hits_element(driver, el):
-                    time.sleep(0.15)
-                    continue
-
-            # 1) clique padrão
-            try:
-                el.click()
+            res = driver.execute_script(JS_CLICK, el) or {}
+            if res.get("ok"):
                 return
-            except (ElementClickInterceptedException, ElementNotInteractableException) as e:
-                last_exc = e
-
-            # 2) Actions
-            try:
-                ActionChains(driver).move_to_element(el).pause(0.05).click().perform()
-                return
-            except Exception as e:
-                last_exc = e
-
-            # 3) JS click
-            try:
-                driver.execute_script("""
-                    const el = arguments[0];
-                    el.focus({preventScroll:true});
-                    const evt = new MouseEvent('click', {bubbles:true, cancelable:true, view:window});
-                    el.dispatchEvent(evt);
-                """, el)
-                return
-            except Exception as e:
-                last_exc = e
-
-        except StaleElementReferenceException as e:
-            last_exc = e
-        except Exception as e:
+            reason = res.get("reason", "?")
+            last_exc = ElementNotInteractableException(f"Clique não efetuado ({reason}).")
+            if reason == "obscured":
+                # se quem cobre não está em OVERLAY_CSS, isto volta no 1º tick: o sleep abaixo segura o loop
+                _wait_no_overlays(driver, timeout=2)
+        except StaleElementReferenceException:
+            raise  # a referência morreu: quem chamou precisa re-buscar o elemento
+        except WebDriverException as e:
             last_exc = e
 
-        time.sleep(0.2)
+        time.sleep(0.1)
 
     raise last_exc or ElementNotInteractableException("Não foi possível clicar no elemento dentro do timeout.")
 
@@ -274,14 +285,14 @@ def click_with_retry(driver, locators: Iterable[Tuple[str, str]], attempts=3, ti
     for _ in range(attempts):
         for by, sel in locators:
             try:
-                el = WebDriverWait(driver, timeout_each).until(EC.element_to_be_clickable((by, sel)))
+                el = _wait(driver, timeout_each).until(EC.element_to_be_clickable((by, sel)))
                 driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
-                time.sleep(0.05)
+                _wait_rect_stable(driver, el)
                 el.click()
                 return
             except (StaleElementReferenceException, ElementClickInterceptedException) as e:
                 last_exc = e; time.sleep(0.2); continue
-            except Exception as e:
+            except (TimeoutException, ElementNotInteractableException) as e:
                 last_exc = e; continue
     raise last_exc or RuntimeError("Falha ao clicar no elemento após múltiplas tentativas.")
 
@@ -305,8 +316,24 @@ def _location_human() -> tuple[str, Optional[str]]:
 # -----------------------------------------------------------------------------
 # Chrome Driver
 # -----------------------------------------------------------------------------
+@dataclass(slots=True)
+class RhidSession:
+    """Chrome vivo + os tmpdirs que pertencem a ele (apagados ao descartar)."""
+    driver: webdriver.Chrome
+    tmp_dirs: list[str]
+
+_DRIVER_PATH: Optional[str] = None  # caminho do chromedriver resolvido (1x por processo)
+
+def _driver_path() -> str:
+    """ChromeDriverManager().install() consulta a rede; resolvemos só na primeira vez."""
+    global _DRIVER_PATH
+    if _DRIVER_PATH is None:
+        _DRIVER_PATH = ChromeDriverManager().install()
+    return _DRIVER_PATH
+
 def _make_chrome_options(*, data_path: str, cache_dir: str, user_data_dir: str | None) -> Options:
     opts = Options()
+    opts.page_load_strategy = PAGE_LOAD_STRATEGY
     if HEADLESS:
         opts.add_argument("--headless=new")
     opts.add_argument("--no-sandbox")
@@ -316,13 +343,20 @@ def _make_chrome_options(*, data_path: str, cache_dir: str, user_data_dir: str |
     opts.add_argument("--disable-infobars")
     opts.add_argument("--disable-notifications")
     opts.add_argument("--window-size=1280,960")
-    opts.add_argument("--incognito")
-    opts.add_argument("--guest")
     opts.add_argument(f"--data-path={data_path}")
     opts.add_argument(f"--disk-cache-dir={cache_dir}")
+    # um modo só: perfil próprio (cookies/cache reaproveitados) ou incognito.
+    # Incognito usa cache HTTP em memória e ignora --disk-cache-dir, então com
+    # RHID_PERSIST_CACHE ele fica de fora para o cache em disco valer.
     if RHID_USE_USER_DATA and user_data_dir:
         opts.add_argument(f"--user-data-dir={user_data_dir}")
         opts.add_argument("--profile-directory=Default")
+    elif not RHID_PERSIST_CACHE:
+        opts.add_argument("--incognito")
+    # headless não deve estrangular timers/render da nossa aba
+    opts.add_argument("--disable-background-timer-throttling")
+    opts.add_argument("--disable-renderer-backgrounding")
+    opts.add_argument("--disable-backgrounding-occluded-windows")
     opts.add_argument("--remote-debugging-port=0")
     opts.add_argument("--no-first-run")
     opts.add_argument("--no-default-browser-check")
@@ -339,45 +373,183 @@ def _make_chrome_options(*, data_path: str, cache_dir: str, user_data_dir: str |
         opts.binary_location = CHROME_BINARY
     return opts
 
-def _build_driver() -> webdriver.Chrome:
-    data_path = _mktemp_under_base("data-")
-    cache_dir = _mktemp_under_base("cache-")
+def _block_assets(driver: webdriver.Chrome) -> None:
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    except WebDriverException as e:
+        log.warning("Não consegui bloquear assets via CDP (seguindo sem): %s", e)
+
+def _new_session_dirs() -> tuple[str, str, Optional[str], list[str]]:
+    """
+    Diretórios do Chrome p/ uma sessão: (data_path, cache_dir, user_data_dir, tmp_dirs).
+    Com RHID_PERSIST_CACHE, data/cache são fixos sob CHROME_USER_DATA_BASE e ficam fora
+    de tmp_dirs (o que não é apagado no fim), para o disk cache valer entre punches.
+    """
+    if RHID_PERSIST_CACHE:
+        data_path = os.path.join(CHROME_USER_DATA_BASE, "data")
+        cache_dir = os.path.join(CHROME_USER_DATA_BASE, "cache")
+        os.makedirs(data_path, exist_ok=True)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_dirs = []
+    else:
+        data_path = _mktemp_under_base("data-")
+        cache_dir = _mktemp_under_base("cache-")
+        tmp_dirs = [data_path, cache_dir]
     user_data_dir: Optional[str] = _mktemp_under_base("profile-") if RHID_USE_USER_DATA else None
+    if user_data_dir:
+        tmp_dirs.append(user_data_dir)
+    return data_path, cache_dir, user_data_dir, tmp_dirs
 
+def _check_binaries() -> str:
+    """
+    Falhas permanentes (binário ausente/sem permissão) não melhoram com retry; o
+    Selenium as reporta como WebDriverException genérica, então checamos antes.
+    Retorna o caminho do chromedriver.
+    """
+    driver_path = _driver_path()
+    if not os.access(driver_path, os.X_OK):
+        raise PermissionError(f"chromedriver ausente ou sem permissão de execução: {driver_path}")
+    if CHROME_BINARY and os.path.exists(CHROME_BINARY) and not os.access(CHROME_BINARY, os.X_OK):
+        raise PermissionError(f"Chrome sem permissão de execução: {CHROME_BINARY}")
+    return driver_path
+
+def _quit_partial(driver: Optional[webdriver.Chrome]) -> None:
+    """Fecha um Chrome que subiu mas falhou na configuração (timeouts/bloqueio de assets)."""
+    if driver is None:
+        return
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def _build_driver() -> RhidSession:
+    driver_path = _check_binaries()
+    data_path, cache_dir, user_data_dir, tmp_dirs = _new_session_dirs()
+
+    attempts = 2
     last_err: Optional[Exception] = None
-    for attempt in (1, 2):
+    for attempt in range(1, attempts + 1):
+        driver: Optional[webdriver.Chrome] = None
         try:
             log.info(
                 "Inicializando Chrome (tentativa %s) data_path=%s cache_dir=%s user_data_dir=%s",
                 attempt, data_path, cache_dir, user_data_dir,
             )
             opts = _make_chrome_options(data_path=data_path, cache_dir=cache_dir, user_data_dir=user_data_dir)
-            service = Service(ChromeDriverManager().install())
+            service = Service(driver_path)
             driver = webdriver.Chrome(service=service, options=opts)
-            driver._tmp_dirs = [data_path, cache_dir] + ([user_data_dir] if user_data_dir else [])
-            return driver
+            # sem isso um driver.get() travado espera o padrão de 300s do Chrome;
+            # implicit wait zerado para não somar com as esperas explícitas
+            driver.set_page_load_timeout(TIMEOUT_SECONDS)
+            driver.set_script_timeout(TIMEOUT_SECONDS)
+            driver.implicitly_wait(0)
+            if RHID_BLOCK_ASSETS:
+                _block_assets(driver)
+            return RhidSession(driver=driver, tmp_dirs=tmp_dirs)
+        except NoSuchDriverException:
+            # driver não encontrado: permanente, não adianta tentar de novo
+            log.exception("chromedriver não encontrado (tentativa %s):", attempt)
+            _cleanup_tmp_list(tmp_dirs)
+            raise
         except (SessionNotCreatedException, WebDriverException) as e:
             last_err = e
             log.warning("Falha ao criar sessão do Chrome (tentativa %s): %s", attempt, e)
-            _cleanup_tmp_list([data_path, cache_dir] + ([user_data_dir] if user_data_dir else []))
-            data_path = _mktemp_under_base("data-")
-            cache_dir = _mktemp_under_base("cache-")
-            user_data_dir = _mktemp_under_base("profile-") if RHID_USE_USER_DATA else None
-            time.sleep(0.8)
+            _quit_partial(driver)
+            _cleanup_tmp_list(tmp_dirs)
+            if attempt == attempts:
+                break
+            data_path, cache_dir, user_data_dir, tmp_dirs = _new_session_dirs()
+            time.sleep(min(0.1 * (2 ** attempt), 0.8))
         except Exception as e:
             last_err = e
             log.exception("Erro inesperado ao criar Chrome (tentativa %s):", attempt)
-            _cleanup_tmp_list([data_path, cache_dir] + ([user_data_dir] if user_data_dir else []))
+            _quit_partial(driver)
+            _cleanup_tmp_list(tmp_dirs)
             break
     assert last_err is not None
     raise last_err
 
+# Sessão reaproveitada entre punches (o worker do bot é um processo longo)
+_SESSION: Optional[RhidSession] = None
+_SESSION_LOCK = threading.Lock()
+
+def _driver_alive(driver: webdriver.Chrome) -> bool:
+    """chromedriver de pé E browser respondendo (o Chrome pode ter caído ocioso)."""
+    try:
+        proc = driver.service.process
+        if proc is None or proc.poll() is not None:
+            return False
+        driver.current_url  # round-trip barato até o browser
+        return True
+    except Exception:
+        return False
+
+def _discard_session() -> None:
+    """Fecha o Chrome reaproveitado (se houver) e limpa seus tmpdirs."""
+    global _SESSION
+    sess, _SESSION = _SESSION, None
+    if sess is None:
+        return
+    try:
+        sess.driver.quit()
+    except Exception:
+        pass
+    _cleanup_tmp_list(sess.tmp_dirs)
+
+# Só vale quando o automator roda no processo principal: um worker de ProcessPoolExecutor
+# sai via os._exit e não executa atexit (o bot chama close_session() explicitamente).
+atexit.register(_discard_session)
+
+def close_session() -> None:
+    """Encerra a sessão reaproveitada; seguro para chamar de fora (respeita o lock)."""
+    with _SESSION_LOCK:
+        _discard_session()
+
+def _get_or_build_session() -> RhidSession:
+    global _SESSION
+    if _SESSION is not None and not _driver_alive(_SESSION.driver):
+        log.warning("Chrome reaproveitado não está mais vivo; recriando.")
+        _discard_session()
+    if _SESSION is None:
+        _SESSION = _build_driver()
+    else:
+        log.info("Reaproveitando sessão do Chrome.")
+    return _SESSION
+
+def _origin(url: str) -> Optional[str]:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc}"
+
+def _invalidate_session(driver: webdriver.Chrome) -> None:
+    """
+    Sem POST_LOGIN_SELECTOR não há como detectar sessão já logada em _login;
+    então limpamos cookies/storage para o próximo punch começar do formulário.
+    Sai da página também, para o atalho por URL de _login não achar que ainda está logado.
+    """
+    if POST_LOGIN_SELECTOR:
+        return
+    try:
+        # delete_all_cookies só alcança o domínio da página atual; com o browser
+        # reaproveitado, cookies de auth de outros hosts (SSO/redirect) sobreviveriam
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+        origins = {_origin(driver.current_url)}
+        origins.add(_origin(os.environ.get("RHID_LOGIN_URL") or os.environ.get("RHID_URL") or ""))
+        for origin in origins - {None}:
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        driver.get("about:blank")
+    except WebDriverException:
+        pass
+
 # -----------------------------------------------------------------------------
 # Fluxo RHID
 # -----------------------------------------------------------------------------
 def _wait_url_contains(driver: webdriver.Chrome, needle: str, timeout: int = TIMEOUT_SECONDS) -> bool:
     try:
-        WebDriverWait(driver, timeout).until(lambda d: needle.lower() in (d.current_url or "").lower())
+        _wait(driver, timeout).until(lambda d: needle.lower() in (d.current_url or "").lower())
         log.info("URL atual contém '%s': %s", needle, driver.current_url)
         return True
     except TimeoutException:
@@ -389,17 +561,30 @@ def _login(driver: webdriver.Chrome, email: str, senha: str) -> None:
     if not url:
         raise RuntimeError("Defina RHID_URL (ou RHID_LOGIN_URL) no .env para a página de login.")
 
-    driver.get(url)
+    # sessão reaproveitada já dentro do app: volta à dashboard (a aba pode ter ficado horas
+    # na marcação anterior, com o modal aberto) e só pula o login se a sessão ainda valer
+    cur = driver.current_url or ""
+    if "#/dashboard" in cur.lower() or "#/marcacao_ponto" in cur.lower():
+        driver.get(cur.split("#", 1)[0] + "#/dashboard")
+        driver.refresh()  # só trocar o hash não recarrega o documento (modal/backdrop ficariam)
+        wait_dom_ready(driver)
+        if maybe_already_logged(driver):
+            log.info("Sessão reutilizada; URL atual: %s", driver.current_url)
+            return
+
+    try:
+        driver.get(url)
+    except TimeoutException:
+        log.warning("Página de login não carregou em %ss; tentando mais uma vez.", TIMEOUT_SECONDS)
+        driver.get(url)
     wait_dom_ready(driver)
-    time.sleep(0.5)
 
     if maybe_already_logged(driver):
         log.info("Já autenticado; URL atual: %s", driver.current_url)
         return
 
-    _ = find_first_visible(driver, EMAIL_SELECTORS, timeout_each=10)
-    _ = find_first_visible(driver, PASSWORD_SELECTORS, timeout_each=10)
-    _ = find_first_visible(driver, LOGIN_BTN_SELECTORS, timeout_each=10)
+    # fail-fast só no e-mail: type_with_retry/click_with_retry já esperam ficar clicável
+    _ = find_first_visible_css(driver, EMAIL_CSS, timeout=10)
 
     type_with_retry(driver, (By.ID, "email"), email)
     log.info("Preencheu campo email.")
@@ -410,7 +595,7 @@ def _login(driver: webdriver.Chrome, email: str, senha: str) -> None:
     log.info("Clique no botão 'Entrar' efetuado. Aguardando redirecionamento para /#/dashboard ...")
 
     try:
-        WebDriverWait(driver, TIMEOUT_SECONDS).until(
+        _wait(driver, TIMEOUT_SECONDS).until(
             lambda d: "#/dashboard" in (d.current_url or "").lower()
                       or d.find_elements(By.XPATH, "//button[contains(@ng-click,'marcacao_ponto') and contains(normalize-space(.),'Registrar Ponto')]")
         )
@@ -418,15 +603,53 @@ def _login(driver: webdriver.Chrome, email: str, senha: str) -> None:
     except TimeoutException:
         log.warning("Não confirmei /#/dashboard explicitamente (prosseguindo). URL atual: %s", driver.current_url)
 
+# Polla no browser uma lista de locators [kind, sel] (em ordem de prioridade; kind 'css'
+# ou 'xpath') e devolve o primeiro nó encontrado; com requireEnabled, só quando esse nó
+# não estiver desabilitado.
+JS_POLL_LOCATORS = """
+const locs = arguments[0], deadline = Date.now() + arguments[1], requireEnabled = arguments[2];
+const cb = arguments[arguments.length - 1];
+(function tick() {
+  for (const [kind, sel] of locs) {
+    const n = kind === 'css'
+      ? document.querySelector(sel)
+      : document.evaluate(sel, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!n) continue;
+    if (!requireEnabled || (!n.disabled && !n.hasAttribute('disabled'))) return cb(n);
+    break;
+  }
+  if (Date.now() > deadline) return cb(null);
+  setTimeout(tick, 50);
+})();
+"""
+
+def _poll_locators(driver: webdriver.Chrome, locators: Iterable[Tuple[str, str]], timeout: float, *, require_enabled: bool = False):
+    """Um único round-trip: o polling roda no browser. Retorna WebElement ou None."""
+    locs = [["css" if by == By.CSS_SELECTOR else "xpath", sel] for by, sel in locators]
+    # folga sobre o prazo do JS para o driver não abortar o script antes dele responder
+    driver.set_script_timeout(timeout + 5)
+    try:
+        return driver.execute_async_script(JS_POLL_LOCATORS, locs, int(timeout * 1000), require_enabled)
+    finally:
+        driver.set_script_timeout(TIMEOUT_SECONDS)
+
 def _registrar_ponto(driver: webdriver.Chrome) -> str:
     """
     1) Dashboard: clicar 'Registrar Ponto' e ir para /#/marcacao_ponto
     2) /#/marcacao_ponto: esperar botão habilitar e clicar
     """
-    def _visible_or_none(by, sel, t=4):
+    def _visible_or_none(locators, t=4):
+        # uma espera só; a cada poll testa os locators EM ORDEM (uma união XPath devolveria
+        # em ordem de documento). find_elements devolve [] em vez de levantar NoSuchElement
+        def _first_visible(d):
+            for by, sel in locators:
+                for el in d.find_elements(by, sel):
+                    if el.is_displayed():
+                        return el
+            return False
         try:
-            return WebDriverWait(driver, t).until(EC.visibility_of_element_located((by, sel)))
-        except Exception:
+            return _wait(driver, t, ignored_exceptions=(StaleElementReferenceException,)).until(_first_visible)
+        except TimeoutException:
             return None
 
     # ---------- ETAPA 1 (DASHBOARD) ----------
@@ -436,17 +659,12 @@ def _registrar_ponto(driver: webdriver.Chrome) -> str:
         (By.XPATH, "//button[contains(@ng-click,'redirect') and contains(normalize-space(.),'Registrar Ponto')]"),
         (By.XPATH, "//button[contains(normalize-space(.),'Registrar Ponto') and contains(@class,'btn-primary')]"),
     ]
-    dash_btn = None
-    for by, sel in dash_btns:
-        el = _visible_or_none(by, sel, t=6)
-        if el:
-            dash_btn = el
-            log.info("Botão da dashboard encontrado por %s: %s", by, sel)
-            break
+    dash_btn = _visible_or_none(dash_btns, t=6)
     if dash_btn:
+        log.info("Botão da dashboard encontrado.")
         try:
             driver.execute_script("arguments[0].scrollIntoView({block:'center'});", dash_btn)
-            time.sleep(0.05)
+            _wait_rect_stable(driver, dash_btn)
             dash_btn.click()
             log.info("CLIQUE executado no botão 'Registrar Ponto' da DASHBOARD.")
         except Exception:
@@ -460,7 +678,11 @@ def _registrar_ponto(driver: webdriver.Chrome) -> str:
 
     # ---------- ETAPA 2 (MARCAÇÃO) ----------
     log.info("Na tela de MARCAÇÃO: procurando botão final 'Registrar Ponto' ...")
+    # do mais específico ao menos: os ancorados em atributo (CSS barato primeiro) quase
+    # sempre resolvem no 1º tick; a varredura de texto da div só roda se eles falharem,
+    # e sempre antes do catch-all, que casaria qualquer botão 'Registrar Ponto'
     final_locators = [
+        (By.CSS_SELECTOR, "button.btn-primary[ng-click*='registraPonto']"),
         (By.XPATH, "//button[contains(@ng-click,'registraPonto') and contains(normalize-space(.),'Registrar Ponto')]"),
         (By.XPATH, "//div[contains(.,'Registre seu ponto') or contains(.,'2 - Registre seu ponto')]//button[contains(normalize-space(.),'Registrar Ponto')]"),
         (By.XPATH, "//button[contains(normalize-space(.),'Registrar Ponto') and contains(@class,'btn-primary')]"),
@@ -468,19 +690,9 @@ def _registrar_ponto(driver: webdriver.Chrome) -> str:
     ]
 
     # localizar (mesmo desabilitado)
-    final_btn = None
-    deadline = time.time() + TIMEOUT_SECONDS
-    while time.time() < deadline and final_btn is None:
-        for by, sel in final_locators:
-            try:
-                el = WebDriverWait(driver, 2).until(EC.presence_of_element_located((by, sel)))
-                final_btn = el
-                log.info("Botão FINAL localizado (pode estar desabilitado) por %s: %s", by, sel)
-                break
-            except Exception:
-                pass
-        if final_btn is None:
-            time.sleep(0.3)
+    final_btn = _poll_locators(driver, final_locators, TIMEOUT_SECONDS)
+    if final_btn:
+        log.info("Botão FINAL localizado (pode estar desabilitado).")
 
     if not final_btn:
         html = _dump_small_html(driver)
@@ -489,25 +701,11 @@ def _registrar_ponto(driver: webdriver.Chrome) -> str:
 
     # esperar habilitar (ng-disabled removido)
     log.info("Aguardando botão FINAL habilitar (ng-disabled ficar falso) ...")
-    def _enabled():
-        try:
-            btn = None
-            for by, sel in final_locators:
-                try:
-                    btn = driver.find_element(by, sel); break
-                except Exception:
-                    continue
-            if not btn:
-                return False
-            disabled_attr = btn.get_attribute("disabled")
-            return btn.is_enabled() and (disabled_attr is None)
-        except StaleElementReferenceException:
-            return False
-
-    try:
-        WebDriverWait(driver, TIMEOUT_SECONDS).until(lambda d: _enabled())
+    enabled_btn = _poll_locators(driver, final_locators, TIMEOUT_SECONDS, require_enabled=True)
+    if enabled_btn:
+        final_btn = enabled_btn
         log.info("Botão FINAL habilitado. Pronto para clicar.")
-    except TimeoutException:
+    else:
         _screenshot(driver)
         raise RuntimeError("Botão FINAL não habilitou dentro do timeout. Verifique geolocalização/permite GPS.")
 
@@ -518,36 +716,31 @@ def _registrar_ponto(driver: webdriver.Chrome) -> str:
 
     # 2.3 clicar (robusto)
     try:
-        # re-obter o botão mais fresco (evita stale após Angular re-render)
-        for by, sel in final_locators:
-            try:
-                final_btn = driver.find_element(by, sel)
-                break
-            except Exception:
-                pass
-
+        # final_btn veio do poller já habilitado; se o Angular re-renderizou (stale),
+        # o fallback re-busca pelo mesmo poller, respeitando a prioridade dos locators
         robust_click(driver, final_btn, timeout=10)
         log.info("CLIQUE executado no botão FINAL 'Registrar Ponto'.")
     except Exception:
+        el = _poll_locators(driver, final_locators, 3, require_enabled=True)
+        if el is None:
+            _screenshot(driver)
+            raise
         try:
-            for by, sel in final_locators:
-                el = WebDriverWait(driver, 3).until(EC.presence_of_element_located((by, sel)))
-                robust_click(driver, el, timeout=6)
-                log.info("CLIQUE (fallback) executado no botão FINAL.")
-                break
-        except Exception as e:
+            robust_click(driver, el, timeout=6)
+            log.info("CLIQUE (fallback) executado no botão FINAL.")
+        except Exception:
             _screenshot(driver)
             raise
 
     # confirmação
     try:
-        WebDriverWait(driver, 8).until(
+        _wait(driver, 8).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "#modalPontoRegistrado, .swal2-popup, .toast, .alert-success"))
         )
         log.info("Confirmação visível (modal/toast).")
     except TimeoutException:
         try:
-            WebDriverWait(driver, 6).until(
+            _wait(driver, 6).until(
                 EC.presence_of_element_located(
                     (By.XPATH, "//*[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'registrado') or "
                                "contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'realizado') or "
@@ -565,14 +758,18 @@ def _registrar_ponto(driver: webdriver.Chrome) -> str:
 # -----------------------------------------------------------------------------
 def run_rhid_punch(trigger: str = "manual", discord_user: Optional[dict] = None):
     """
-    Retorna um dict pronto para o Discord:
-      {"content": "", "embeds": [ ... ]}
+    Retorna uma tupla marcada (kind, payload) pronta para o Discord:
+      ("embeds", {"content": "", "embeds": [ ... ], "maps_url": ...})
     """
+    with _SESSION_LOCK:
+        return _run_rhid_punch_locked(trigger, discord_user)
+
+def _run_rhid_punch_locked(trigger: str, discord_user: Optional[dict]):
     driver: Optional[webdriver.Chrome] = None
     started_at = datetime.now(timezone.utc)
 
     try:
-        driver = _build_driver()
+        driver = _get_or_build_session().driver
         rhid_email = os.environ.get("RHID_EMAIL", "")
         rhid_senha = os.environ.get("RHID_PASSWORD", "")
         if not rhid_email or not rhid_senha:
@@ -611,22 +808,23 @@ def run_rhid_punch(trigger: str = "manual", discord_user: Optional[dict] = None)
             "color": color,
             "fields": fields,
             "footer": { "text": f"Trigger: {trigger}" },
-            "timestamp": datetime.now(timezone.utc).isoformat()
+            "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
         }
 
-        return {"content": "", "embeds": [embed], "maps_url": maps_link}
+        return "embeds", {"content": "", "embeds": [embed], "maps_url": maps_link}
 
     except TimeoutException as e:
         log.exception("Timeout no fluxo RHID")
         raise RuntimeError(f"Falha ao registrar ponto: Timeout ({e})") from e
+    except WebDriverException as e:
+        # erro do próprio driver/Chrome: a sessão não é confiável, descarta
+        log.exception("Falha do WebDriver no fluxo RHID; descartando sessão")
+        _discard_session()
+        driver = None
+        raise RuntimeError(f"Falha ao registrar ponto: {e}") from e
     except Exception as e:
         log.exception("Falha no fluxo RHID")
         raise RuntimeError(f"Falha ao registrar ponto: {e}") from e
     finally:
         if driver:
-            try:
-                driver.quit()
-            except Exception:
-                pass
-            tmp_dirs = getattr(driver, "_tmp_dirs", [])
-            _cleanup_tmp_list(tmp_dirs)
+            _invalidate_session(driver)